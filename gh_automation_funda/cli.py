@@ -3,11 +3,8 @@
 import asyncio
 from logging import basicConfig, getLogger
 
-import asyncpg
 import typer
 
-from gh_automation_funda.config import Config
-
 basicConfig(
     level="INFO",
     format="[[{asctime} {levelname:8s} {name}:{lineno:<4d}]] {message}",
@@ -20,13 +17,16 @@ app = typer.Typer()
 
 async def time_async() -> None:
     """Get the time from the DB and prints it."""
-    config = Config()
-    connection = await asyncpg.connect(config.postgres.dsn)
+    from gh_automation_funda.config import get_config
+
+    config = get_config()
+    pool = await config.get_pg_pool()
     try:
-        result = await connection.fetch("SELECT now();")
-        typer.echo(result[0][0])
+        async with pool.acquire() as connection:
+            result = await connection.fetch("SELECT now();")
+            typer.echo(result[0][0])
     finally:
-        await connection.close()
+        await config.close()
 
 
 @app.command()
@@ -38,34 +38,38 @@ def time() -> None:
 @app.command()
 def dsn() -> None:
     """Print the DSN."""
-    config = Config()
-    typer.echo(config.postgres.dsn)
+    from gh_automation_funda.config import PostgresConfig
+
+    typer.echo(PostgresConfig().dsn)
 
 
 @app.command()
 def init() -> None:
     """Initialize a new project"""
+    from gh_automation_funda.config import get_config
     from gh_automation_funda.persistence.init import cmd_init
 
-    config = Config()
+    config = get_config()
     asyncio.run(cmd_init(config))
 
 
 @app.command()
 def clean() -> None:
     """Clean the database"""
+    from gh_automation_funda.config import get_config
     from gh_automation_funda.persistence.init import cmd_clean
 
-    config = Config()
+    config = get_config()
     asyncio.run(cmd_clean(config))
 
 
 @app.command()
 def funda() -> None:
     """Run the funda pipeline"""
+    from gh_automation_funda.config import get_config
     from gh_automation_funda.pipelines.funda import cmd_funda
 
-    config = Config()
+    config = get_config()
     asyncio.run(cmd_funda(config))
 
 
@@ -1,29 +1,56 @@
 """Configuration for the application."""
 import asyncio
 import os
+import re
+from collections import defaultdict
+from functools import cache, cached_property
 from importlib import import_module
 from logging import getLogger
-from typing import Annotated, Any, Literal, Self, TypeVar, cast
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated, Any, Final, Literal, Self, TypeVar, cast
 
-from dotenv import load_dotenv
+from dotenv import dotenv_values, find_dotenv
+from httpx import AsyncClient, Limits
 from pydantic import (
     BaseModel,
     Field,
     PlainSerializer,
+    PrivateAttr,
     field_serializer,
     model_validator,
 )
 from pydantic_settings import BaseSettings
 
+from gh_automation_funda.persistence.cache import PageCache
 from gh_automation_funda.persistence.settings import read_google_sheets
 
+if TYPE_CHECKING:
+    import asyncpg
+
 logger = getLogger(__name__)
 
 
 ENV_PREFIX = "GH_AUTO_"
 SSLMode = Literal["require", "verify-ca", "verify-full", "prefer", "allow", "disable"]
+RE_GOOGLE_SHEETS_ENV: Final[re.Pattern[str]] = re.compile(rf"^{ENV_PREFIX}GOOGLE_SHEETS_(\d+)_(SHEET_ID|GID|MODEL)$")
+
+
+@cache
+def load_env() -> dict[str, str]:
+    """Parse the ``.env`` file once per process and export its variables.
+
+    Variables already set in the environment take precedence over the ones from the file.
 
-load_dotenv()
+    Returns:
+        The variables read from the ``.env`` file.
+    """
+    values = {key: value for key, value in dotenv_values(find_dotenv()).items() if value is not None}
+    for key, value in values.items():
+        os.environ.setdefault(key, value)
+    return values
+
+
+load_env()
 
 ModelT = TypeVar("ModelT", bound=BaseModel)
 
@@ -50,7 +77,8 @@ class GoogleSheetsConfig(BaseSettings):
         - ``GH_AUTO_GOOGLE_SHEETS_*_GID``: The ID of the sheet within the Google Sheet.
         - ``GH_AUTO_GOOGLE_SHEETS_*_MODEL``: The Pydantic model class to use for the data.
 
-        The * is a number between 1 and 10.
+        The * is a positive number. The Google Sheets are returned ordered by that number.
+        Variables that are empty are ignored, and so are the numbers missing one of the three variables.
 
         Note:
             This will not check whether the remote Google Sheets are accessible nor in the correct format.
@@ -61,47 +89,68 @@ class GoogleSheetsConfig(BaseSettings):
         Raises:
             ValueError: If one or more models are invalid.
         """
-        env_prefix = cls.Config.env_prefix
+        env_vars = tuple(
+            sorted(
+                (int(match[1]), match[2], value)
+                for key, value in os.environ.items()
+                if value and (match := RE_GOOGLE_SHEETS_ENV.match(key))
+            )
+        )
+        return list(cls._create_from_env_vars(env_vars))
+
+    @classmethod
+    @cache
+    def _create_from_env_vars(cls, env_vars: tuple[tuple[int, str, str], ...]) -> tuple[Self, ...]:
+        """Create the GoogleSheetsConfig from the (index, field, value) triplets found in the environment.
+
+        The result is cached, so that the models are only resolved again when the environment changes.
+        """
+        sheets: defaultdict[int, dict[str, str]] = defaultdict(dict)
+        for i, field, value in env_vars:
+            sheets[i][field] = value
+
         configs = []
         all_models_are_valid = True
-        for i in range(1, 10):  # Assuming a max of 10 configs
-            sheet_id = os.environ.get(f"{env_prefix}{i}_SHEET_ID")
-            gid = os.environ.get(f"{env_prefix}{i}_GID")
-            model = os.environ.get(f"{env_prefix}{i}_MODEL")
+        for i, sheet in sheets.items():
+            sheet_id = sheet.get("SHEET_ID")
+            gid = sheet.get("GID")
+            model = sheet.get("MODEL")
+
+            if not (sheet_id and gid and model):
+                logger.warning(f"Skipping Google Sheet #{i} due to incomplete configuration.")
+                continue
 
-            if sheet_id and gid and model:
-                model_class = cls.__load_model(model)
+            model_class = _load_model(model)
 
-                if model_class is None:
-                    all_models_are_valid = False
-                    logger.warning(f"Skipping Google Sheet {sheet_id} due to invalid model {model}.")
-                    continue
+            if model_class is None:
+                all_models_are_valid = False
+                logger.warning(f"Skipping Google Sheet {sheet_id} due to invalid model {model}.")
+                continue
 
-                configs.append(cls(sheet_id=sheet_id, gid=gid, model=model_class))
-            else:
-                break
+            configs.append(cls(sheet_id=sheet_id, gid=gid, model=model_class))
 
         if not all_models_are_valid:
             raise ValueError("Some models are invalid.")
 
-        return configs
+        return tuple(configs)
 
-    @staticmethod
-    def __load_model(model: str) -> type[BaseModel] | None:
-        """Load a Pydantic model from a string."""
-        try:
-            model_path, model_name = model.rsplit(".", 1)
-            model_module = import_module(model_path)
-            model_class = getattr(model_module, model_name)
 
-            if not issubclass(model_class, BaseModel):
-                raise AttributeError(f"Model {model} is not a subclass of Pydantic's BaseModel.")
+@cache
+def _load_model(model: str) -> type[BaseModel] | None:
+    """Load a Pydantic model from a string (the result is cached)."""
+    try:
+        model_path, model_name = model.rsplit(".", 1)
+        model_module = import_module(model_path)
+        model_class = getattr(model_module, model_name)
 
-        except (ImportError, AttributeError) as e:
-            logger.error(f"Cannot import model {model} due to error: {e}")
-            return None
+        if not issubclass(model_class, BaseModel):
+            raise AttributeError(f"Model {model} is not a subclass of Pydantic's BaseModel.")
 
-        return cast(type[BaseModel], model_class)
+    except (ImportError, AttributeError) as e:
+        logger.error(f"Cannot import model {model} due to error: {e}")
+        return None
+
+    return cast(type[BaseModel], model_class)
 
 
 class LazyDynamicSetting(BaseModel):
@@ -150,39 +199,66 @@ class PostgresConfig(BaseSettings):
 
     class Config:
         env_prefix = f"{ENV_PREFIX}PG_"
+        frozen = True
 
-    @property
+    @cached_property
     def host(self) -> str:
         """Return the host for the database."""
         return f"{self.aiven.service}-{self.aiven.project}.aivencloud.com"
 
-    @property
+    @cached_property
     def dsn(self) -> str:
         """Return the DSN for the database."""
         return (
             f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}?sslmode={self.sslmode}"
         )
 
-    @property
+    @cached_property
     def yoyo_dns(self) -> str:
         """Return the DSN for the database (with the correct driver for Yoyo migration)."""
         return f"postgresql+psycopg://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}?sslmode={self.sslmode}"
 
 
+class FundaConfig(BaseSettings):
+    """Configuration for the Funda pipeline."""
+
+    # Maximum number of properties scraped at the same time
+    max_concurrency: int = Field(default=8, gt=0)
+    # Validate the scraped data with the Pydantic models (slower, useful when debugging the scrapers)
+    validate_properties: bool = Field(default=False)
+    # SQLite file caching the Funda.nl pages between runs (no cache when unset)
+    page_cache_path: Path | None = Field(default=None)
+    # Time after which a cached page is fetched again, in seconds
+    page_cache_ttl: int = Field(default=86400, gt=0)
+
+    class Config:
+        env_prefix = f"{ENV_PREFIX}FUNDA_"
+
+
 class Config(BaseSettings):
     """Base configuration class."""
 
     postgres: PostgresConfig = Field(default_factory=PostgresConfig)
+    funda: FundaConfig = Field(default_factory=FundaConfig)
     google_sheets: list[GoogleSheetsConfig] = Field(default_factory=list)
     dynamic_settings: dict[type[BaseModel], LazyDynamicSetting] = Field(default_factory=dict, init_var=False)
     loaded_dynamic_settings: dict[type[BaseModel], list[BaseModel]] = Field(default_factory=dict, init_var=False)
 
+    _pg_pool: "asyncpg.Pool[asyncpg.Record] | None" = PrivateAttr(default=None)
+    _http_client: AsyncClient | None = PrivateAttr(default=None)
+    _page_cache: PageCache | None = PrivateAttr(default=None)
+    _dynamic_settings_locks: dict[type[BaseModel], asyncio.Lock] = PrivateAttr(default_factory=dict)
+
     @field_serializer("loaded_dynamic_settings")
     def serialize_loaded_dynamic_settings(
         self, v: dict[type[BaseModel], list[BaseModel]]
     ) -> dict[str, list[dict[str, Any]]]:
-        """Serialize the loaded dynamic settings."""
-        return {model.__name__: [model.model_dump(row) for row in rows] for model, rows in v.items()}
+        """Serialize the loaded dynamic settings (with each model's serializer looked up once)."""
+        serialized = {}
+        for model, rows in v.items():
+            to_python = model.__pydantic_serializer__.to_python
+            serialized[model.__name__] = [to_python(row) for row in rows]
+        return serialized
 
     @model_validator(mode="before")
     @classmethod
@@ -194,20 +270,74 @@ class Config(BaseSettings):
         return data
 
     async def get_settings_for(self, model: type[ModelT]) -> list[ModelT]:
-        """Return the settings of a model."""
+        """Return the settings of a model.
+
+        The settings are loaded at most once, even when requested concurrently.
+        """
         if model not in self.loaded_dynamic_settings:
-            self.loaded_dynamic_settings[model] = await self.dynamic_settings[model].load()
+            async with self._dynamic_settings_locks.setdefault(model, asyncio.Lock()):
+                if model not in self.loaded_dynamic_settings:
+                    self.loaded_dynamic_settings[model] = await self.dynamic_settings[model].load()
         return cast(list[ModelT], self.loaded_dynamic_settings[model])
 
     async def preload_all_dynamic_settings(self) -> None:
-        """Load all dynamic settings."""
-        for model, setting in self.dynamic_settings.items():
-            self.loaded_dynamic_settings[model] = await setting.load()
+        """Load all dynamic settings (concurrently)."""
+        results = await asyncio.gather(*(setting.load() for setting in self.dynamic_settings.values()))
+        self.loaded_dynamic_settings.update(zip(self.dynamic_settings, results))
+
+    async def get_pg_pool(self) -> "asyncpg.Pool[asyncpg.Record]":
+        """Return the shared Postgres connection pool, creating it on first use."""
+        if self._pg_pool is None:
+            import asyncpg
+
+            self._pg_pool = await asyncpg.create_pool(
+                self.postgres.dsn,
+                min_size=1,
+                max_size=10,
+                statement_cache_size=1024,
+            )
+        return self._pg_pool
+
+    def get_http_client(self) -> AsyncClient:
+        """Return the shared HTTP client, creating it on first use.
+
+        Sharing one client lets all the scrapers reuse connections (and TLS sessions) to the same hosts.
+        """
+        if self._http_client is None:
+            self._http_client = AsyncClient(limits=Limits(max_connections=50, max_keepalive_connections=20))
+        return self._http_client
+
+    def get_page_cache(self) -> PageCache | None:
+        """Return the shared cache of the Funda.nl pages, opening it on first use (``None`` if not configured)."""
+        if self._page_cache is None and self.funda.page_cache_path is not None:
+            self._page_cache = PageCache(self.funda.page_cache_path, ttl=self.funda.page_cache_ttl)
+        return self._page_cache
+
+    async def close(self) -> None:
+        """Close the resources held by the configuration (Postgres connection pool, HTTP client and page cache)."""
+        if self._pg_pool is not None:
+            await self._pg_pool.close()
+            self._pg_pool = None
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        if self._page_cache is not None:
+            self._page_cache.close()
+            self._page_cache = None
 
     class Config:
         env_prefix = ENV_PREFIX
 
 
+@cache
+def get_config() -> Config:
+    """Return the configuration of the process (built on first call).
+
+    Use ``get_config.cache_clear()`` to force it to be built again (e.g. after changing the environment).
+    """
+    return Config()
+
+
 if __name__ == "__main__":
     # load_dotenv("../.env.example")
     config = Config()
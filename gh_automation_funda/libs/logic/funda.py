@@ -1,18 +1,13 @@
 """Logic for Funda API."""
 
-from asyncio import TaskGroup
+from asyncio import Semaphore, TaskGroup
+from itertools import chain
 from logging import getLogger
-from typing import Any, cast
+from typing import Any, Final, TypeVar, cast
 
 from httpx import HTTPStatusError
-from tenacity import (
-    Future,
-    RetryCallState,
-    retry,
-    retry_if_exception_type,
-    stop_after_attempt,
-    wait_random,
-)
+from pydantic import BaseModel
+from tenacity import Future, RetryCallState, retry, retry_if_exception_type, wait_random
 
 from gh_automation_funda.config import Config
 from gh_automation_funda.libs.models import (
@@ -23,6 +18,7 @@ from gh_automation_funda.libs.models import (
     PropertyFundaData,
     PropertyFundaImage,
 )
+from gh_automation_funda.libs.scrapers.client import RETRY_STATUS_CODES
 from gh_automation_funda.libs.scrapers.funda import (
     PropertyFromFundaData,
     get_new_properties_url,
@@ -37,6 +33,13 @@ from gh_automation_funda.persistence.settings import FundaSetting
 
 logger = getLogger(__name__)
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+# The fields of PropertyFundaData that are scraped as-is from Funda.nl.
+_FUNDA_DATA_FIELDS: Final[tuple[str, ...]] = tuple(
+    field for field in PropertyFundaData.model_fields if field in PropertyFromFundaData.__annotations__
+)
+
 
 def _retry_error_callback(retry_state: RetryCallState) -> None:
     """Log the error while executing a function."""
@@ -54,6 +57,21 @@ def _retry_error_callback(retry_state: RetryCallState) -> None:
         logger.warning(exc_note)
 
 
+def _stop(retry_state: RetryCallState) -> bool:
+    """Stop after 3 attempts, or right away on the HTTP error statuses that the scrapers' requests retried already."""
+    if retry_state.attempt_number >= 3:
+        return True
+    exception = retry_state.outcome.exception() if retry_state.outcome is not None else None
+    return isinstance(exception, HTTPStatusError) and exception.response.status_code in RETRY_STATUS_CODES
+
+
+def _build_model(model_class: type[ModelT], validate: bool, **data: Any) -> ModelT:
+    """Build a model from scraped data, skipping the validation unless requested."""
+    if validate:
+        return model_class.model_validate(data)
+    return model_class.model_construct(**data)
+
+
 class Funda:
     def __init__(self, config: Config) -> None:
         self.config = config
@@ -61,27 +79,45 @@ class Funda:
     async def get_new_properties(self) -> list[Property]:
         """Get the new properties from Funda.nl."""
         settings = await self.config.get_settings_for(FundaSetting)
-        urls = set()
-
-        for funda_setting in settings:
-            batch_urls = await get_new_properties_url(
-                area=funda_setting.area,
-                price_min=funda_setting.price_min,
-                price_max=funda_setting.price_max,
-                days_old=funda_setting.days_old,
-                object_type=funda_setting.object_type,
-            )
-            urls.update(batch_urls)
+        client = self.config.get_http_client()
+
+        # The task group cancels the other searches when one fails, and its first error is raised as-is.
+        try:
+            async with TaskGroup() as tg:
+                search_tasks = [
+                    tg.create_task(
+                        get_new_properties_url(
+                            client=client,
+                            area=funda_setting.area,
+                            price_min=funda_setting.price_min,
+                            price_max=funda_setting.price_max,
+                            days_old=funda_setting.days_old,
+                            object_type=funda_setting.object_type,
+                        )
+                    )
+                    for funda_setting in settings
+                ]
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0] from None
+
+        # A dict deduplicates the URLs while keeping the order in which Funda.nl listed them.
+        urls = dict.fromkeys(chain.from_iterable(task.result() for task in search_tasks))
 
         logger.info(f"Found {len(urls)} new properties.")
         for url in urls:
             logger.info(f" - {url}")
 
+        semaphore = Semaphore(self.config.funda.max_concurrency)
         async with TaskGroup() as tg:
-            tasks = [tg.create_task(self.get_property_data_and_save(url)) for url in urls]
+            tasks = [tg.create_task(self._get_property_data_and_save_bounded(semaphore, url)) for url in urls]
 
         return [prop for task in tasks if (prop := task.result()) is not None]
 
+    async def _get_property_data_and_save_bounded(self, semaphore: Semaphore, url: str) -> Property | None:
+        """Get the data for a property and save it, without exceeding the concurrency limit."""
+        async with semaphore:
+            return await self.get_property_data_and_save(url)
+
     async def get_property_data_and_save(self, url: str) -> Property | None:
         """Get the data for a property from Funda.nl and save it."""
         property_data = await self.get_property_all_data(url)
@@ -94,91 +130,88 @@ class Funda:
         return property_data
 
     @retry(
-        stop=stop_after_attempt(3),
+        stop=_stop,
         wait=wait_random(min=1, max=3),
         retry=retry_if_exception_type(HTTPStatusError),
         retry_error_callback=_retry_error_callback,
     )
     async def get_property_all_data(self, url: str) -> Property | None:
         """Get the data for a property from Funda.nl."""
-        data_funda = await get_property_data(url)
+        client = self.config.get_http_client()
+        data_funda = await get_property_data(url, client=client, cache=self.config.get_page_cache())
         if not data_funda:
             return None
 
-        cadaster_url = await get_cadaster_url_from_address(
-            street_and_house_number=data_funda["name"],
-            postal_code=data_funda["postal_code"],
-            city=data_funda["city"],
+        # The cadaster and WOZ lookups only depend on the address, so they can run concurrently.
+        # The task group cancels the other lookup when one fails, and its first error is raised as-is for the retry.
+        try:
+            async with TaskGroup() as tg:
+                cadaster_task = tg.create_task(self._get_cadaster_data(data_funda))
+                woz_task = tg.create_task(
+                    get_property_woz_data(
+                        client=client,
+                        street_and_house_number=data_funda["name"],
+                        postal_code=data_funda["postal_code"],
+                        city=data_funda["city"],
+                    )
+                )
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0] from None
+
+        return self._assemble_property_data(
+            data_funda, cadaster_task.result(), woz_task.result(), validate=self.config.funda.validate_properties
         )
-        cadaster_data = await get_property_cadaster_data(cadaster_url) if cadaster_url else None
 
-        woz_data = await get_property_woz_data(
+    async def _get_cadaster_data(self, data_funda: PropertyFromFundaData) -> dict[str, Any] | None:
+        """Get the cadastral data for a property from Kadasterdata.nl, if any."""
+        client = self.config.get_http_client()
+        cadaster_url = await get_cadaster_url_from_address(
+            client=client,
             street_and_house_number=data_funda["name"],
             postal_code=data_funda["postal_code"],
             city=data_funda["city"],
         )
-
-        return self._assemble_property_data(data_funda, cadaster_data, woz_data)
+        return await get_property_cadaster_data(cadaster_url, client=client) if cadaster_url else None
 
     @staticmethod
     def _assemble_property_data(
         data_funda: PropertyFromFundaData,
         data_cadaster: dict[str, Any] | None,
         data_woz: dict[str, Any],
+        *,
+        validate: bool = False,
     ) -> Property:
-        """Assemble the data for a property."""
+        """Assemble the data for a property.
+
+        The scrapers are trusted, so the models are not validated unless ``validate`` is set.
+        """
         cadastral_data = None
         if data_cadaster:
-            cadastral_data = PropertyCadastralData(
-                cadastral_url=data_cadaster["cadastral_url"],
-                value_min=data_cadaster["value_min"],
-                value_max=data_cadaster["value_max"],
-                value_calculated_on=data_cadaster["value_calculated_on"],
-            )
-
-        return Property(
+            cadastral_data = _build_model(PropertyCadastralData, validate, **data_cadaster)
+
+        funda_fields = {field: cast(dict[str, Any], data_funda)[field] for field in _FUNDA_DATA_FIELDS}
+
+        return _build_model(
+            Property,
+            validate,
             name=data_funda["name"],
             address=data_funda["address"],
             city=data_funda["city"],
             postal_code=data_funda["postal_code"],
             latitude=data_funda["latitude"],
             longitude=data_funda["longitude"],
-            funda_data=PropertyFundaData(
-                url=data_funda["url"],
-                asking_price=data_funda["asking_price"],
-                price_per_m2=data_funda["price_per_m2"],
-                availability_status=data_funda["availability_status"],
-                offered_since=data_funda["offered_since"],
-                year_built=data_funda["year_built"],
-                area_to_live=data_funda["area_to_live"],
-                area_of_plot=data_funda["area_of_plot"],
-                area_extras=data_funda["area_extras"],
-                volume=data_funda["volume"],
-                number_of_rooms=data_funda["number_of_rooms"],
-                number_of_floors=data_funda["number_of_floors"],
-                energy_label=data_funda["energy_label"],
-                property_type=data_funda["property_type"],
-                has_roof_terrace=data_funda["has_roof_terrace"],
-                has_garden=data_funda["has_garden"],
-                has_balcony=data_funda["has_balcony"],
-                has_solar_panels=data_funda["has_solar_panels"],
-                has_parking_on_site=data_funda["has_parking_on_site"],
-                has_parking_on_closed_site=data_funda["has_parking_on_closed_site"],
-                is_energy_efficient=data_funda["is_energy_efficient"],
-            ),
+            funda_data=_build_model(PropertyFundaData, validate, **funda_fields),
             funda_images=[
-                PropertyFundaImage(name=name, image_url=url) for name, url in data_funda["funda_images"].items()
+                _build_model(PropertyFundaImage, validate, name=name, image_url=url)
+                for name, url in data_funda["funda_images"].items()
             ],
             cadastral_data=cadastral_data,
-            cadastral_woz=PropertyCadastralWOZ(
+            cadastral_woz=_build_model(
+                PropertyCadastralWOZ,
+                validate,
                 woz_url=data_woz["woz_url"],
                 woz_data=[
-                    PropertyCadastralWOZItem(
-                        year=woz_line["year"],
-                        reference_date=woz_line["reference_date"],
-                        value=woz_line["value"],
-                    )
-                    for woz_line in data_woz["woz_data"]
+                    _build_model(PropertyCadastralWOZItem, validate, **woz_line) for woz_line in data_woz["woz_data"]
                 ],
             ),
         )
@@ -1,5 +1,6 @@
 """This module contains the models used for the funda pipeline."""
 
+import re
 import warnings
 from datetime import date, datetime
 from decimal import Decimal
@@ -17,6 +18,8 @@ VALID_AREA_EXTRAS: Final[dict[str, str]] = {
     "Gebouwgebonden buitenruimte": "building_related_outdoor_space",
     "Externe bergruimte": "external_storage_space",
 }
+IGNORED_AREA_EXTRAS: Final[frozenset[str]] = frozenset(("Wonen", "Perceel", "Inhoud"))
+AREA_VALUE_REGEX: Final[re.Pattern[str]] = re.compile(r"\s*(\d+)\s*(?:m²|m³)?\s*")
 PROPERTY_TYPES: Final[dict[str, str]] = {
     "woonhuis": "residential house",
     "appartement": "apartment",
@@ -32,33 +35,41 @@ PROPERTY_TYPES: Final[dict[str, str]] = {
 
 def translate_property_type_nl_to_en(property_type_nl: str) -> str:
     """Translate the Dutch property type to the English property type."""
-    if property_type_nl.lower() not in PROPERTY_TYPES:
+    property_type = PROPERTY_TYPES.get(property_type_nl.lower())
+    if property_type is None:
         warnings.warn(f"Unknown property type: {property_type_nl}", UserWarning)
         return property_type_nl
 
-    return PROPERTY_TYPES[property_type_nl.lower()]
+    return property_type
 
 
-def format_area_extra(name_nl: str, value: str) -> tuple[str, int] | None:
-    """Format the area extra name and value, and filter out unwanted ones."""
-    if name_nl in ("Wonen", "Perceel", "Inhoud"):
-        return None
+def _warn_unknown_area_extra(name_nl: str, value: str) -> None:
+    """Warn about an area extra that is neither known nor ignored."""
+    if name_nl in IGNORED_AREA_EXTRAS:
+        return
 
-    name = VALID_AREA_EXTRAS.get(name_nl)
+    value = value.strip()
+    if value.endswith("m²"):
+        warnings.warn(f"Unknown area extra name: {name_nl}", UserWarning)
+    elif value.endswith("m³"):
+        warnings.warn(f"Unknown volume extra name: {name_nl}", UserWarning)
 
-    if name is None:
-        if value.strip().endswith("m²"):
-            warnings.warn(f"Unknown area extra name: {name_nl}", UserWarning)
-        elif value.strip().endswith("m³"):
-            warnings.warn(f"Unknown volume extra name: {name_nl}", UserWarning)
-        return None
 
-    return name, int(value.strip().removesuffix("m²").removesuffix("m³").strip())
+def get_clean_area_extras(area_extras: Mapping[str, str]) -> dict[str, int]:
+    """Get the clean area extras (the known ones, with their value in m² or m³)."""
+    clean_area_extras = {}
+    for name_nl, value in area_extras.items():
+        name = VALID_AREA_EXTRAS.get(name_nl)
+        if name is None:
+            _warn_unknown_area_extra(name_nl, value)
+            continue
 
+        match = AREA_VALUE_REGEX.fullmatch(value)
+        if match is None:
+            raise ValueError(f"Invalid value for area extra {name_nl}: {value}")
+        clean_area_extras[name] = int(match[1])
 
-def get_clean_area_extras(area_extras: Mapping[str, str]) -> dict[str, int]:
-    """Get the clean area extras."""
-    return {extra[0]: extra[1] for k, v in area_extras.items() if (extra := format_area_extra(k, v)) is not None}
+    return clean_area_extras
 
 
 class Availability(str, Enum):
@@ -71,11 +82,14 @@ class Availability(str, Enum):
     @classmethod
     def from_nl(cls, availability: str) -> "Availability":
         """Convert the Dutch availability to the English availability."""
-        return {
-            "beschikbaar": cls.AVAILABLE,
-            "inonderhandeling": cls.NEGOTIATED,
-            "verkocht": cls.SOLD,
-        }[availability.lower()]
+        return AVAILABILITY_NL[availability.lower()]
+
+
+AVAILABILITY_NL: Final[dict[str, Availability]] = {
+    "beschikbaar": Availability.AVAILABLE,
+    "inonderhandeling": Availability.NEGOTIATED,
+    "verkocht": Availability.SOLD,
+}
 
 
 class EnergyLabel(str, Enum):
@@ -166,8 +180,8 @@ class Property(BaseModel):
     address: str = Field(..., max_length=255, description="The address of the property.")
     city: str = Field(..., max_length=255, description="The city of the property.")
     postal_code: str = Field(..., max_length=255, description="The postal code of the property.")
-    latitude: Decimal = Field(..., description="The latitude of the property.")
-    longitude: Decimal = Field(..., description="The longitude of the property.")
+    latitude: float = Field(..., description="The latitude of the property.")
+    longitude: float = Field(..., description="The longitude of the property.")
     created_at: datetime = Field(default_factory=datetime.now, description="The creation date of the property.")
     updated_at: datetime = Field(default_factory=datetime.now, description="The last update date of the property.")
     funda_data: PropertyFundaData = Field(..., description="The Funda.nl data of the property.")
@@ -0,0 +1,107 @@
+"""HTTP helpers shared by the scrapers."""
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from logging import getLogger
+from typing import Any, Final
+
+from httpx import AsyncClient, HTTPStatusError, Response, TransportError
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+
+logger = getLogger(__name__)
+
+# Rate limiting and temporary server errors, worth trying again.
+RETRY_STATUS_CODES: Final[frozenset[int]] = frozenset({429, 502, 503, 504})
+MAX_ATTEMPTS: Final[int] = 4
+MAX_WAIT: Final[float] = 30.0
+WAIT_BACKOFF: Final = wait_exponential_jitter(initial=1, max=MAX_WAIT)
+
+
+def _get_retry_after(response: Response) -> float | None:
+    """Return the number of seconds to wait according to the ``Retry-After`` header, if any."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _is_transient_error(exception: BaseException) -> bool:
+    """Return whether the request may succeed when sent again."""
+    if isinstance(exception, HTTPStatusError):
+        return exception.response.status_code in RETRY_STATUS_CODES
+    return isinstance(exception, TransportError)
+
+
+def _wait(retry_state: RetryCallState) -> float:
+    """Wait as long as the server asked (``Retry-After``), or back off exponentially (with jitter)."""
+    exception = retry_state.outcome.exception() if retry_state.outcome is not None else None
+    if isinstance(exception, HTTPStatusError):
+        retry_after = _get_retry_after(exception.response)
+        if retry_after is not None:
+            return min(retry_after, MAX_WAIT)
+    return WAIT_BACKOFF(retry_state)
+
+
+def _log_before_sleep(retry_state: RetryCallState) -> None:
+    """Log the transient error before waiting to send the request again."""
+    exception = retry_state.outcome.exception() if retry_state.outcome is not None else None
+    if isinstance(exception, HTTPStatusError):
+        error = f"HTTP {exception.response.status_code} from {exception.request.url}"
+    else:
+        error = repr(exception)
+    sleep = retry_state.next_action.sleep if retry_state.next_action is not None else 0
+    logger.warning(f"{error}, retrying in {sleep:.1f}s (attempt #{retry_state.attempt_number}).")
+
+
+async def request_with_retry(client: AsyncClient, method: str, url: str, **kwargs: Any) -> Response:
+    """Send a request, and send it again on transport errors, rate limiting or temporary server errors.
+
+    Error statuses are returned as-is (including the transient ones, once the attempts are exhausted),
+    so that the scrapers keep handling them with ``raise_for_status``.
+
+    Params:
+        client: The HTTP client.
+        method: The HTTP method.
+        url: The URL.
+        kwargs: The keyword arguments of ``AsyncClient.request``.
+
+    Returns:
+        The response.
+
+    Raises:
+        httpx.TransportError: If the request still cannot be sent after the last attempt.
+    """
+
+    async def send() -> Response:
+        response = await client.request(method, url, **kwargs)
+        if response.status_code in RETRY_STATUS_CODES:
+            response.raise_for_status()
+        return response
+
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        wait=_wait,
+        retry=retry_if_exception(_is_transient_error),
+        before_sleep=_log_before_sleep,
+        reraise=True,
+    )
+    try:
+        return await retrying(send)
+    except HTTPStatusError as e:
+        return e.response
@@ -5,12 +5,11 @@ import asyncio
 import json
 import re
 import warnings
-from datetime import date, datetime
+from datetime import date
 from decimal import Decimal
 from html import unescape
-from typing import Any, Final, TypedDict, cast
+from typing import TYPE_CHECKING, Any, Final, TypedDict, cast
 
-from bs4 import BeautifulSoup, Tag
 from httpx import AsyncClient
 
 from gh_automation_funda.libs.models import (
@@ -19,6 +18,11 @@ from gh_automation_funda.libs.models import (
     get_clean_area_extras,
     translate_property_type_nl_to_en,
 )
+from gh_automation_funda.libs.scrapers.client import request_with_retry
+from gh_automation_funda.persistence.cache import PageCache
+
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup, Tag
 
 FUNDA_SEARCH_URL: Final[str] = "https://www.funda.nl/zoeken/koop"
 FUNDA_HEADERS: Final[dict[str, str]] = {
@@ -40,6 +44,23 @@ FUNDA_HEADERS: Final[dict[str, str]] = {
     ),
 }
 ALT_PHOTO_REGEX: Final[re.Pattern[str]] = re.compile(r"Foto (\d+) van (\d+)")
+SINGLE_TO_DOUBLE_QUOTES: Final[dict[int, str]] = str.maketrans({"'": '"'})
+LD_JSON_REGEX: Final[re.Pattern[bytes]] = re.compile(rb'<script type="application/ld\+json">(.*?)</script>', re.DOTALL)
+ENERGY_LABELS: Final[dict[str, EnergyLabel]] = {label.value: label for label in EnergyLabel}
+NL_MONTHS: Final[dict[str, int]] = {
+    "januari": 1,
+    "februari": 2,
+    "maart": 3,
+    "april": 4,
+    "mei": 5,
+    "juni": 6,
+    "juli": 7,
+    "augustus": 8,
+    "september": 9,
+    "oktober": 10,
+    "november": 11,
+    "december": 12,
+}
 
 
 class PropertyFromFundaData(TypedDict):
@@ -68,20 +89,30 @@ class PropertyFromFundaData(TypedDict):
     address: str
     city: str
     postal_code: str
-    latitude: Decimal
-    longitude: Decimal
+    latitude: float
+    longitude: float
     funda_images: dict[str, str]
 
 
 def _extract_in_between(text: str, start_tag: str, end_tag: str) -> str:
     """Extract the text between two tags."""
-    idx_start = text.find(start_tag)
-    idx_end = text[idx_start:].find(end_tag) + idx_start
-    return text[idx_start + len(start_tag) : idx_end]
+    return text.partition(start_tag)[2].partition(end_tag)[0]
+
+
+def _parse_js_object(payload: str) -> dict[str, Any]:
+    """Parse a JavaScript object literal, such as the one pushed to the GTM data layer.
+
+    The object is written with single quotes (and HTML-escaped values), so swapping the quotes
+    is usually enough to get JSON. ``ast.literal_eval`` (much slower) is only used as a fallback.
+    """
+    try:
+        return cast(dict[str, Any], json.loads(payload.translate(SINGLE_TO_DOUBLE_QUOTES)))
+    except json.JSONDecodeError:
+        return cast(dict[str, Any], ast.literal_eval(payload))
 
 
 async def get_new_properties_url(
-    *, area: list[str], price_min: int, price_max: int, days_old: int = 3, object_type: list[str]
+    *, client: AsyncClient, area: list[str], price_min: int, price_max: int, days_old: int = 3, object_type: list[str]
 ) -> list[str]:
     """Get the new properties from Funda.nl.
 
@@ -97,8 +128,7 @@ async def get_new_properties_url(
         "object_type": f"[{object_types}]",
     }
 
-    async with AsyncClient() as client:
-        response = await client.get(FUNDA_SEARCH_URL, params=params, headers=FUNDA_HEADERS)
+    response = await request_with_retry(client, "GET", FUNDA_SEARCH_URL, params=params, headers=FUNDA_HEADERS)
 
     try:
         response.raise_for_status()
@@ -106,16 +136,8 @@ async def get_new_properties_url(
         e.add_note(f"Error while reading Funda.nl: {e}")
         raise e
 
-    start_tag = '<script type="application/ld+json">'
-    end_tag = "</script>"
-    payload = ""
-
-    for line in response.text.splitlines():
-        if start_tag in line and end_tag in line:
-            idx_start = line.find(start_tag)
-            idx_end = line[idx_start:].find(end_tag) + idx_start
-            payload = line[idx_start + len(start_tag) : idx_end]
-            break
+    match = LD_JSON_REGEX.search(response.content)
+    payload = match[1] if match else b""
 
     if not payload:
         return []
@@ -125,18 +147,32 @@ async def get_new_properties_url(
     return [item["url"] for item in data.get("itemListElement", [])]
 
 
-async def get_property_data(url: str) -> PropertyFromFundaData | None:
-    """Get the data for a property from Funda.nl."""
-    async with AsyncClient(follow_redirects=True) as client:
-        response = await client.get(url, headers=FUNDA_HEADERS)
+async def get_property_data(
+    url: str, *, client: AsyncClient, cache: PageCache | None = None
+) -> PropertyFromFundaData | None:
+    """Get the data for a property from Funda.nl.
 
-    try:
-        response.raise_for_status()
-    except Exception as e:
-        e.add_note(f"Error while reading Funda.nl: {e}")
-        raise e
+    When a cache is given, the page is only fetched if it is not already cached.
+    """
+    cached = cache.get(url) if cache is not None else None
+    if cached is None:
+        response = await request_with_retry(client, "GET", url, headers=FUNDA_HEADERS, follow_redirects=True)
 
-    soup = BeautifulSoup(response.text, "html.parser")
+        try:
+            response.raise_for_status()
+        except Exception as e:
+            e.add_note(f"Error while reading Funda.nl: {e}")
+            raise e
+
+        # The parser decodes the raw bytes itself, so there is no need to build response.text.
+        final_url, html = str(response.url), response.content
+    else:
+        final_url, html = cached
+
+    # Imported here, so that runs finding no new properties never load BeautifulSoup.
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
 
     try:
         data = _extract_hidden_script_data(soup)
@@ -150,6 +186,10 @@ async def get_property_data(url: str) -> PropertyFromFundaData | None:
         e.add_note(f"Error while reading {url}")
         raise
 
+    # Only the pages that could be read are cached, so that e.g. a consent page is fetched again on the next run.
+    if cache is not None and cached is None:
+        cache.set(url, final_url, html)
+
     if energy_label is not data2["energy_label"]:
         # Known mismatch: A+ to A5+ are all seen as A in the advert data.
         if data2["energy_label"] is EnergyLabel.A and "+" in energy_label.value:
@@ -158,7 +198,7 @@ async def get_property_data(url: str) -> PropertyFromFundaData | None:
             warnings.warn(f"Energy label mismatch: {energy_label} vs {data2['energy_label']}", UserWarning)
 
     return {
-        "url": str(response.url),
+        "url": final_url,
         "asking_price": data["asking_price"],
         "price_per_m2": data["asking_price"] / data2["area_to_live"],
         "availability_status": data2["availability_status"],
@@ -189,7 +229,7 @@ async def get_property_data(url: str) -> PropertyFromFundaData | None:
     }
 
 
-def _extract_advert_data(soup: BeautifulSoup) -> dict[str, Any]:
+def _extract_advert_data(soup: "BeautifulSoup") -> dict[str, Any]:
     script_ad_targeting = soup.find(
         "script", attrs={"type": "application/ld+json", "data-advertisement-targeting": True}
     )
@@ -200,7 +240,7 @@ def _extract_advert_data(soup: BeautifulSoup) -> dict[str, Any]:
         "year_built": int(data["bouwjaar"]),
         "area_to_live": int(data["woonoppervlakte"]),
         "number_of_rooms": int(data["aantalkamers"]),
-        "energy_label": EnergyLabel(data.get("energieklasse", EnergyLabel.UNKNOWN).upper()),
+        "energy_label": ENERGY_LABELS.get(data.get("energieklasse", "").upper(), EnergyLabel.UNKNOWN),
         "property_type": translate_property_type_nl_to_en(data["soortobject"]),
         "has_roof_terrace": data.get("dakterras", "false") == "true",
         "has_garden": data.get("tuin", "false") == "true",
@@ -212,15 +252,17 @@ def _extract_advert_data(soup: BeautifulSoup) -> dict[str, Any]:
     }
 
 
-def _extract_hidden_script_data(soup: BeautifulSoup) -> dict[str, Any]:
+def _parse_dutch_date(text: str) -> date:
+    """Parse a date written in Dutch (e.g. ``3 november 2023``), whatever the locale of the process."""
+    day, month, year = text.split()
+    return date(int(year), NL_MONTHS[month.lower()], int(day))
+
+
+def _extract_hidden_script_data(soup: "BeautifulSoup") -> dict[str, Any]:
     script_gtm = soup.find("script", attrs={"data-test-gtm-script": True})
     payload = _extract_in_between(script_gtm.text, "gtmDataLayer.push(", ");")  # type: ignore
-    data = ast.literal_eval(payload)
-    offered_since = (
-        date.today()
-        if data["aangebodensinds"] == "Vandaag"
-        else datetime.strptime(data["aangebodensinds"], "%d %B %Y").date()
-    )
+    data = _parse_js_object(payload)
+    offered_since = date.today() if data["aangebodensinds"] == "Vandaag" else _parse_dutch_date(data["aangebodensinds"])
     return {
         "asking_price": Decimal(data["koopprijs"]),
         "offered_since": offered_since,
@@ -229,7 +271,7 @@ def _extract_hidden_script_data(soup: BeautifulSoup) -> dict[str, Any]:
     }
 
 
-def _extract_number_of_floors(soup: BeautifulSoup) -> int:
+def _extract_number_of_floors(soup: "BeautifulSoup") -> int:
     floors_str = (
         soup.find("dt", string="Aantal woonlagen")  # type: ignore
         .next_sibling.next_sibling.text.strip()
@@ -250,17 +292,17 @@ def _extract_number_of_floors(soup: BeautifulSoup) -> int:
     return int(floors_str.split()[0])
 
 
-def _extract_image_urls(soup: BeautifulSoup) -> dict[str, str]:
-    images = soup.find_all("img", attrs={"data-media-viewer-overview-image": True}, alt=ALT_PHOTO_REGEX)
-    image_urls = {
-        f"Photo {int(m.groups()[0])} / {int(m.groups()[1])}": img.attrs["data-lazy"]
+def _extract_image_urls(soup: "BeautifulSoup") -> dict[str, str]:
+    # The alt text is matched once per image, here rather than also in find_all.
+    images = soup.find_all("img", attrs={"data-media-viewer-overview-image": True, "alt": True})
+    return {
+        f"Photo {int(m[1])} / {int(m[2])}": img.attrs["data-lazy"]
         for img in images
         if (m := ALT_PHOTO_REGEX.match(img.attrs["alt"]))
     }
-    return image_urls
 
 
-def _extract_geo_data(soup: BeautifulSoup) -> dict[str, Any]:
+def _extract_geo_data(soup: "BeautifulSoup") -> dict[str, Any]:
     script_object_map_config = soup.find("script", attrs={"type": "application/json", "data-object-map-config": True})
     data = json.loads(script_object_map_config.text)  # type: ignore
     return {
@@ -270,13 +312,16 @@ def _extract_geo_data(soup: BeautifulSoup) -> dict[str, Any]:
     }
 
 
-def _extract_areas_and_volume(soup: BeautifulSoup) -> dict[str, Any]:
-    data = {}
+def _extract_areas_and_volume(soup: "BeautifulSoup") -> dict[str, Any]:
     usable_surfaces_child = soup.find(
         "dt", attrs={"class": "object-kenmerken-group-header object-kenmerken-group-header-half"}
     )
-    for dt in usable_surfaces_child.parent.find_all("dt"):  # type: ignore
-        data[dt.text.strip()] = dt.next_sibling.next_sibling.text.strip()
+    # Each <dt> is paired with its own next <dd> sibling, so that a term with several (or nested) <dd>s
+    # does not shift the following pairs.
+    data = {
+        dt.text.strip(): dt.find_next_sibling("dd").text.strip()
+        for dt in usable_surfaces_child.parent.find_all("dt")  # type: ignore
+    }
     return {
         "area_of_plot": int(data.get("Perceel", "0").removesuffix(" m²")),
         "area_extras": get_clean_area_extras(data),
@@ -284,7 +329,7 @@ def _extract_areas_and_volume(soup: BeautifulSoup) -> dict[str, Any]:
     }
 
 
-def _extract_energy_label(soup: BeautifulSoup) -> EnergyLabel:
+def _extract_energy_label(soup: "BeautifulSoup") -> EnergyLabel:
     """Extract the energy label from the page.
 
     The tag looks like this:
@@ -302,38 +347,47 @@ def _extract_energy_label(soup: BeautifulSoup) -> EnergyLabel:
             <span class="energielabel-index" title="Energie-Indexcijfer 1,84">1,84</span>
         </span>
     """
-    energy_label_tag = cast(Tag, soup.find("span", class_="energielabel"))
+    energy_label_tag = cast("Tag", soup.find("span", class_="energielabel"))
     if not energy_label_tag:
         return EnergyLabel.UNKNOWN
 
     # Get the title, check if it starts with "Energielabel" and strip it.
     energy_label_title = energy_label_tag.attrs["title"]
     if energy_label_title.startswith("Energielabel "):
-        energy_label_from_title = EnergyLabel(energy_label_title.removeprefix("Energielabel ").strip())
+        energy_label_from_title = energy_label_title.removeprefix("Energielabel ").strip()
         text = energy_label_tag.contents[0].get_text(strip=True)
         if energy_label_from_title.upper() != text.upper():
             warnings.warn(f"Energy label mismatch: title={energy_label_from_title} vs body={text}", UserWarning)
     else:
         text = energy_label_tag.get_text(strip=True)
 
-    try:
-        return EnergyLabel(text)
-    except ValueError:
+    energy_label = ENERGY_LABELS.get(text)
+    if energy_label is None:
         warnings.warn(f"Unknown energy label: {text}", UserWarning)
+        return EnergyLabel.UNKNOWN
 
-    return EnergyLabel.UNKNOWN
+    return energy_label
 
 
 async def main() -> None:
     """Main entry point (for testing)."""
-    urls = await get_new_properties_url(area=["almere"], price_min=300_000, price_max=500_000, object_type=["house"])
-    print(urls)
-    for url in urls:
-        try:
-            property_1 = await get_property_data(url)
-            print(property_1)
-        except Exception as e:
-            print(f"Error while reading {url}: {e}")
+    async with AsyncClient() as client:
+        urls = await get_new_properties_url(
+            client=client, area=["almere"], price_min=300_000, price_max=500_000, object_type=["house"]
+        )
+        print(urls)
+        semaphore = asyncio.Semaphore(10)
+
+        async def fetch(url: str) -> PropertyFromFundaData | None:
+            async with semaphore:
+                return await get_property_data(url, client=client)
+
+        results = await asyncio.gather(*(fetch(url) for url in urls), return_exceptions=True)
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                print(f"Error while reading {url}: {result}")
+            else:
+                print(result)
 
 
 if __name__ == "__main__":
@@ -2,30 +2,51 @@
 
 import asyncio
 import re
-from datetime import datetime
+from datetime import date
+from html import unescape
 from logging import getLogger
 from typing import Any, Final, cast
 
-from bs4 import BeautifulSoup
 from httpx import AsyncClient
 
+from gh_automation_funda.libs.scrapers.client import request_with_retry
+
 logger = getLogger(__name__)
 
 URL_KADASTERDATA: Final[str] = "https://www.kadasterdata.nl"
 URL_KADASTERDATA_SEARCH: Final[str] = f"{URL_KADASTERDATA}/api-hd/autocomplete"
 RE_MONEY_VALUE_EURO: Final[re.Pattern[str]] = re.compile(r"€\s+([\d\.]+)")
 RE_VALUE_CALCULATED_ON: Final[re.Pattern[str]] = re.compile(r"Berekend op (\d{2}-\d{2}-\d{4})")
+RE_HTML_TAG: Final[re.Pattern[str]] = re.compile(r"<[^>]*>")
+# The amount block comes before the date block in the page summary. Both may contain nested divs:
+# the amount is captured up to the opening of the date block, and the date up to its own closing tag
+# (skipping over the nested divs) rather than up to the first closing tag.
+RE_SUMMARY: Final[re.Pattern[bytes]] = re.compile(
+    rb'<div\b[^>]*\bclass="[^"]*\bpage-summary__amount\b[^"]*"[^>]*>(?P<amount>.*?)'
+    rb'<div\b[^>]*\bclass="[^"]*\bpage-summary__date\b[^"]*"[^>]*>'
+    rb"(?P<date>(?:<div\b[^>]*>.*?</div>|(?!</div>).)*?)</div>",
+    re.DOTALL,
+)
+
+
+def _html_to_text(html: bytes, encoding: str) -> str:
+    """Return the text of an HTML fragment (decoded, without its tags, and with the entities unescaped)."""
+    return unescape(RE_HTML_TAG.sub("", html.decode(encoding, errors="replace")))
+
+
+def _parse_dutch_numeric_date(text: str) -> date:
+    """Parse a date written as ``DD-MM-YYYY`` (the format is already checked by ``RE_VALUE_CALCULATED_ON``)."""
+    return date(int(text[6:10]), int(text[3:5]), int(text[:2]))
 
 
 async def get_cadaster_url_from_address(
-    *, street_and_house_number: str, postal_code: str = "", city: str
+    *, client: AsyncClient, street_and_house_number: str, postal_code: str = "", city: str
 ) -> str | None:
     """Get the URL for a property from Kadasterdata.nl."""
     address = f"{street_and_house_number}, {postal_code} {city}"
     params = {"q": address}
 
-    async with AsyncClient(follow_redirects=True) as client:
-        response = await client.post(URL_KADASTERDATA_SEARCH, params=params)
+    response = await request_with_retry(client, "POST", URL_KADASTERDATA_SEARCH, params=params, follow_redirects=True)
 
     try:
         response.raise_for_status()
@@ -48,7 +69,7 @@ async def get_cadaster_url_from_address(
     return url
 
 
-async def get_property_cadaster_data(url: str) -> dict[str, Any] | None:
+async def get_property_cadaster_data(url: str, *, client: AsyncClient) -> dict[str, Any] | None:
     """Get the data for a property from Kadasterdata.nl."""
     out_when_incomplete = {
         "cadastral_url": url,
@@ -57,8 +78,7 @@ async def get_property_cadaster_data(url: str) -> dict[str, Any] | None:
         "value_calculated_on": None,
     }
 
-    async with AsyncClient(follow_redirects=True) as client:
-        response = await client.get(url)
+    response = await request_with_retry(client, "GET", url, follow_redirects=True)
 
     try:
         response.raise_for_status()
@@ -66,16 +86,16 @@ async def get_property_cadaster_data(url: str) -> dict[str, Any] | None:
         e.add_note(f"Error while reading Kadasterdata.nl: {e}")
         raise e
 
-    soup = BeautifulSoup(response.text, "html.parser")
-
-    summary_amount = soup.find("div", class_="page-summary__amount")
-    summary_date = soup.find("div", class_="page-summary__date")
+    # Only the two summary blocks are needed: they are found with a single regex scan over the raw bytes,
+    # and only they are decoded.
+    summary = RE_SUMMARY.search(response.content)
+    encoding = response.encoding or "utf-8"
 
-    if not summary_amount or not summary_date:
+    if not summary:
         logger.warning(f"Could not find cadaster summary for {url}")
         return out_when_incomplete
 
-    values = RE_MONEY_VALUE_EURO.findall(summary_amount.text)
+    values = RE_MONEY_VALUE_EURO.findall(_html_to_text(summary["amount"], encoding))
     if len(values) != 2:
         logger.warning(f"Could not find cadaster value for {url}")
         return out_when_incomplete
@@ -84,7 +104,7 @@ async def get_property_cadaster_data(url: str) -> dict[str, Any] | None:
     value_min = int(value_min.replace(".", ""))
     value_max = int(value_max.replace(".", ""))
 
-    value_calculated_on = RE_VALUE_CALCULATED_ON.findall(summary_date.text)
+    value_calculated_on = RE_VALUE_CALCULATED_ON.findall(_html_to_text(summary["date"], encoding))
     if not value_calculated_on:
         logger.warning(f"Could not find cadaster value calculated on for {url}")
         return out_when_incomplete
@@ -93,28 +113,29 @@ async def get_property_cadaster_data(url: str) -> dict[str, Any] | None:
         "cadastral_url": url,
         "value_min": value_min,
         "value_max": value_max,
-        "value_calculated_on": datetime.strptime(value_calculated_on[0], "%d-%m-%Y").date(),
+        "value_calculated_on": _parse_dutch_numeric_date(value_calculated_on[0]),
     }
 
 
 async def main() -> None:
     """Run the main function (for testing)."""
-    # Kerkstraat 1, 1234AB Amsterdam
-    url = await get_cadaster_url_from_address(
-        street_and_house_number="Kerkstraat 1", postal_code="1234AB", city="Amsterdam"
-    )
-    print(url)
-    assert url is None
-
-    # Harderwijkoever 16, 1324HA Almere
-    url2 = await get_cadaster_url_from_address(
-        street_and_house_number="Harderwijkoever 16", postal_code="1324HA", city="Almere"
-    )
-    print(url2)
-    assert url2 == "https://www.kadasterdata.nl/almere/harderwijkoever/16"
-
-    data = await get_property_cadaster_data(url2)
-    print(data)
+    async with AsyncClient() as client:
+        # Kerkstraat 1, 1234AB Amsterdam
+        url = await get_cadaster_url_from_address(
+            client=client, street_and_house_number="Kerkstraat 1", postal_code="1234AB", city="Amsterdam"
+        )
+        print(url)
+        assert url is None
+
+        # Harderwijkoever 16, 1324HA Almere
+        url2 = await get_cadaster_url_from_address(
+            client=client, street_and_house_number="Harderwijkoever 16", postal_code="1324HA", city="Almere"
+        )
+        print(url2)
+        assert url2 == "https://www.kadasterdata.nl/almere/harderwijkoever/16"
+
+        data = await get_property_cadaster_data(url2, client=client)
+        print(data)
 
 
 if __name__ == "__main__":
@@ -1,13 +1,17 @@
 """Scrapers for WOZwaardeloket.nl."""
 
 import asyncio
+import time
 import warnings
-from datetime import datetime
+from datetime import date
 from logging import getLogger
-from typing import Any, cast
+from typing import Any, Final, cast
+from weakref import WeakKeyDictionary
 
 from httpx import AsyncClient
 
+from gh_automation_funda.libs.scrapers.client import request_with_retry
+
 logger = getLogger(__name__)
 
 URL_WOZWAARDELOKET = "https://www.wozwaardeloket.nl"
@@ -16,6 +20,16 @@ URL_WOZWAARDELOKET_DATA = f"{URL_WOZWAARDELOKET}/wozwaardeloket-api/v1/wozwaarde
 URL_WOZ_SUGGEST = "https://api.pdok.nl/bzk/locatieserver/search/v3_1/suggest"
 URL_WOZ_LOOKUP = "https://api.pdok.nl/bzk/locatieserver/search/v3_1/lookup"
 
+# Resolved PDOK identifiers, kept for the lifetime of the process (an address does not change its identifiers).
+LOOKUP_IDS: Final[dict[str, str]] = {}
+DESIGNATION_IDS: Final[dict[str, str]] = {}
+
+# A WOZwaardeloket.nl session (cookie) is started once per client, and started again after this many seconds.
+WOZ_SESSION_TTL: Final[float] = 10 * 60
+# The time (monotonic) when the session of each client was started, and the locks to start them only once.
+_woz_sessions_started_at: WeakKeyDictionary[AsyncClient, float] = WeakKeyDictionary()
+_woz_sessions_locks: WeakKeyDictionary[AsyncClient, asyncio.Lock] = WeakKeyDictionary()
+
 HEADERS_WOZWAARDELOKET = {
     "Accept": "application/json, text/plain, */*",
     "Accept-Language": "en-US,en;q=0.5",
@@ -35,16 +49,22 @@ HEADERS_WOZWAARDELOKET = {
 }
 
 
-async def get_lookup_id_from_address(*, street_and_house_number: str, postal_code: str = "", city: str) -> str | None:
+async def get_lookup_id_from_address(
+    *, client: AsyncClient, street_and_house_number: str, postal_code: str = "", city: str
+) -> str | None:
     """Get the URL for a property from WOZwaardeloket.nl.
 
-    We do a GET https://api.pdok.nl/bzk/locatieserver/search/v3_1/suggest?q=Harderwijkoever%2016%2C%201324HA%20Almere&rows=10
+    We do a GET https://api.pdok.nl/bzk/locatieserver/search/v3_1/suggest?q=Harderwijkoever%2016%2C%201324HA%20Almere&fq=type%3Aadres&rows=1
     """
     address = f"{street_and_house_number}, {postal_code} {city}"
-    params = {"q": address, "rows": "10"}
+    if address in LOOKUP_IDS:
+        return LOOKUP_IDS[address]
+
+    # Only addresses have a designation ID, so the other types (postcode, street...) are filtered out by PDOK,
+    # and the best match is the only one needed.
+    params = {"q": address, "fq": "type:adres", "rows": "1"}
 
-    async with AsyncClient(follow_redirects=True) as client:
-        response = await client.get(URL_WOZ_SUGGEST, params=params)
+    response = await request_with_retry(client, "GET", URL_WOZ_SUGGEST, params=params, follow_redirects=True)
 
     try:
         response.raise_for_status()
@@ -64,25 +84,25 @@ async def get_lookup_id_from_address(*, street_and_house_number: str, postal_cod
 
     first_result = response_obj["docs"][0]
 
-    if first_result["type"] == "postcode":
-        first_result = next((result for result in response_obj["docs"] if result["type"] == "adres"), {"type": ""})
-
     if first_result["type"] != "adres":
         warnings.warn(f"Could not find address type for {address}: {first_result['type']}", UserWarning)
 
-    return cast(str, first_result["id"])
+    lookup_id = LOOKUP_IDS[address] = cast(str, first_result["id"])
+    return lookup_id
 
 
-async def get_designation_id_from_lookup_id(lookup_id: str) -> str | None:
+async def get_designation_id_from_lookup_id(lookup_id: str, *, client: AsyncClient) -> str | None:
     """Get the designation ID for a property from WOZwaardeloket.nl.
 
     We do a GET https://api.pdok.nl/bzk/locatieserver/search/v3_1/lookup?fl=*&id=adr-ffe6e5dd684b70643d696c6b5e64f877
 
     """
+    if lookup_id in DESIGNATION_IDS:
+        return DESIGNATION_IDS[lookup_id]
+
     params = {"fl": "*", "id": lookup_id}
 
-    async with AsyncClient(follow_redirects=True) as client:
-        response = await client.get(URL_WOZ_LOOKUP, params=params)
+    response = await request_with_retry(client, "GET", URL_WOZ_LOOKUP, params=params, follow_redirects=True)
 
     try:
         response.raise_for_status()
@@ -105,19 +125,53 @@ async def get_designation_id_from_lookup_id(lookup_id: str) -> str | None:
     if first_result["type"] != "adres":
         logger.warning(f"Found non-address result for {lookup_id}: {first_result['type']}")
 
-    return cast(str, first_result["nummeraanduiding_id"])
+    designation_id = DESIGNATION_IDS[lookup_id] = cast(str, first_result["nummeraanduiding_id"])
+    return designation_id
+
 
+def _is_woz_session_valid(client: AsyncClient) -> bool:
+    """Return whether the client has a WOZwaardeloket.nl session that has not expired."""
+    started_at = _woz_sessions_started_at.get(client)
+    return started_at is not None and time.monotonic() - started_at < WOZ_SESSION_TTL
 
-async def get_woz_data(designation_id: str) -> list[dict[str, Any]]:
+
+async def _ensure_woz_session(client: AsyncClient, *, renew: bool = False) -> None:
+    """Start a WOZwaardeloket.nl session for the client, unless it already has a valid one.
+
+    Concurrent callers wait for the first one to start the session, instead of starting their own.
+    """
+    if renew:
+        _woz_sessions_started_at.pop(client, None)
+    elif _is_woz_session_valid(client):
+        return
+
+    async with _woz_sessions_locks.setdefault(client, asyncio.Lock()):
+        if _is_woz_session_valid(client):
+            return
+        response = await request_with_retry(
+            client, "POST", URL_WOZWAARDELOKET_SESSION_START, headers=HEADERS_WOZWAARDELOKET, follow_redirects=True
+        )
+        # A failed start is not remembered, so that the next lookup tries to start a session again.
+        if response.is_success:
+            _woz_sessions_started_at[client] = time.monotonic()
+        else:
+            logger.warning(f"Could not start a WOZwaardeloket.nl session: HTTP {response.status_code}")
+
+
+async def get_woz_data(designation_id: str, *, client: AsyncClient) -> list[dict[str, Any]]:
     """Get the data for a property from WOZwaardeloket.nl.
 
     We do a GET https://www.wozwaardeloket.nl/wozwaardeloket-api/v1/wozwaarde/nummeraanduiding/0363010000000003
     """
     url = f"{URL_WOZWAARDELOKET_DATA}/{designation_id}"
 
-    async with AsyncClient(follow_redirects=True, headers=HEADERS_WOZWAARDELOKET) as client:
-        await client.post(URL_WOZWAARDELOKET_SESSION_START)
-        response = await client.get(url)
+    await _ensure_woz_session(client)
+    response = await request_with_retry(client, "GET", url, headers=HEADERS_WOZWAARDELOKET, follow_redirects=True)
+
+    if response.status_code in (401, 403):
+        # The session expired earlier than expected: start a new one and try again.
+        await _ensure_woz_session(client, renew=True)
+        response = await request_with_retry(client, "GET", url, headers=HEADERS_WOZWAARDELOKET, follow_redirects=True)
 
     try:
         response.raise_for_status()
@@ -136,23 +190,25 @@ async def get_woz_data(designation_id: str) -> list[dict[str, Any]]:
             "value": woz_value["vastgesteldeWaarde"],
         }
         for woz_value in woz_values
-        if (reference_date := datetime.strptime(woz_value["peildatum"], "%Y-%m-%d").date())
+        if (reference_date := date.fromisoformat(woz_value["peildatum"]))
     ]
 
 
-async def get_property_woz_data(*, street_and_house_number: str, postal_code: str = "", city: str) -> dict[str, Any]:
+async def get_property_woz_data(
+    *, client: AsyncClient, street_and_house_number: str, postal_code: str = "", city: str
+) -> dict[str, Any]:
     """Get the data for a property from WOZwaardeloket.nl."""
     lookup_id = await get_lookup_id_from_address(
-        street_and_house_number=street_and_house_number, postal_code=postal_code, city=city
+        client=client, street_and_house_number=street_and_house_number, postal_code=postal_code, city=city
     )
     if not lookup_id:
         return {}
 
-    designation_id = await get_designation_id_from_lookup_id(lookup_id)
+    designation_id = await get_designation_id_from_lookup_id(lookup_id, client=client)
     if not designation_id:
         return {}
 
-    woz_data = await get_woz_data(designation_id)
+    woz_data = await get_woz_data(designation_id, client=client)
 
     return {
         "woz_url": f"{URL_WOZWAARDELOKET_DATA}/{designation_id}",
@@ -162,15 +218,18 @@ async def get_property_woz_data(*, street_and_house_number: str, postal_code: st
 
 async def main() -> None:
     """Run the main program (for testing)."""
-    # Kerkstraat 1, 1234AB Amsterdam
-    data = await get_property_woz_data(street_and_house_number="Kerkstraat 1", postal_code="1234AB", city="Amsterdam")
-    print(data)
-
-    # Harderwijkoever 16, 1324HA Almere
-    data = await get_property_woz_data(
-        street_and_house_number="Harderwijkoever 16", postal_code="1324HA", city="Almere"
-    )
-    print(data)
+    async with AsyncClient() as client:
+        # Kerkstraat 1, 1234AB Amsterdam
+        data = await get_property_woz_data(
+            client=client, street_and_house_number="Kerkstraat 1", postal_code="1234AB", city="Amsterdam"
+        )
+        print(data)
+
+        # Harderwijkoever 16, 1324HA Almere
+        data = await get_property_woz_data(
+            client=client, street_and_house_number="Harderwijkoever 16", postal_code="1324HA", city="Almere"
+        )
+        print(data)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,42 @@
+"""On-disk cache for the scraped web pages."""
+
+import sqlite3
+import time
+from pathlib import Path
+
+
+class PageCache:
+    """A SQLite-backed cache of web pages, keyed by URL.
+
+    Entries older than ``ttl`` seconds are ignored (and replaced on the next fetch).
+    """
+
+    def __init__(self, path: Path, ttl: int) -> None:
+        self.ttl = ttl
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, final_url TEXT NOT NULL, fetched_at INTEGER NOT NULL, content BLOB NOT NULL"
+            ")"
+        )
+
+    def get(self, url: str) -> tuple[str, bytes] | None:
+        """Return the final URL (after redirects) and the content of a page, if cached and not expired."""
+        row = self._connection.execute(
+            "SELECT final_url, content FROM pages WHERE url = ? AND fetched_at > ?",
+            (url, int(time.time()) - self.ttl),
+        ).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def set(self, url: str, final_url: str, content: bytes) -> None:
+        """Store a page in the cache."""
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (url, final_url, fetched_at, content) VALUES (?, ?, ?, ?)",
+                (url, final_url, int(time.time()), content),
+            )
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        self._connection.close()
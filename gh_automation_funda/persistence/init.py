@@ -46,13 +46,11 @@ async def initialize_database(config: Config) -> None:
 
 
 async def check_if_database_exists(config: Config) -> bool:
-    """Check if the database exists."""
+    """Check if the database exists (by opening the shared connection pool)."""
     try:
-        connection = await asyncpg.connect(config.postgres.dsn)
+        await config.get_pg_pool()
     except asyncpg.exceptions.PostgresError:
         return False
-    else:
-        await connection.close()
 
     return True
 
@@ -60,33 +58,34 @@ async def check_if_database_exists(config: Config) -> bool:
 async def check_if_yoyo_tables_exist(config: Config, required_tables: list[str]) -> bool:
     """Check if the required yoyo tables exist."""
     try:
-        connection = await asyncpg.connect(config.postgres.dsn)
-        await connection.fetch("SELECT now();")
-        # check all the required tables exist
-        table_count = await connection.fetch(
+        pool = await config.get_pg_pool()
+        # The pool's statement cache keeps this query prepared on each connection.
+        table_count = await pool.fetchval(
             "SELECT count(*) FROM pg_catalog.pg_tables WHERE tablename = ANY($1);",
             required_tables,
         )
-        return bool(table_count[0][0] == len(required_tables))
     except asyncpg.exceptions.InvalidCatalogNameError:
         return False
-    finally:
-        await connection.close()
+
+    return bool(table_count == len(required_tables))
 
 
 async def cmd_init(config: Config) -> None:
     """Initialize a new project, to work with yoyo migrations."""
-    if not await check_if_database_exists(config):
-        echo(f"Database {config.postgres.database} does not exist. Creating it.")
-        await initialize_database(config)
-
-    if not await check_if_yoyo_tables_exist(config, required_tables=[PostgresqlPsycopgBackend.lock_table]):
-        echo(f"Database {config.postgres.database} does not have the required yoyo tables." f" Creating them.")
-        backend = cast(PostgresqlPsycopgBackend, get_backend(config.postgres.yoyo_dns))
-        tables = backend.list_tables()
-        echo(tables)
-    else:
-        echo(f"Database {config.postgres.database} has the required yoyo tables. Skipping creation.")
+    try:
+        if not await check_if_database_exists(config):
+            echo(f"Database {config.postgres.database} does not exist. Creating it.")
+            await initialize_database(config)
+
+        if not await check_if_yoyo_tables_exist(config, required_tables=[PostgresqlPsycopgBackend.lock_table]):
+            echo(f"Database {config.postgres.database} does not have the required yoyo tables." f" Creating them.")
+            backend = cast(PostgresqlPsycopgBackend, get_backend(config.postgres.yoyo_dns))
+            tables = backend.list_tables()
+            echo(tables)
+        else:
+            echo(f"Database {config.postgres.database} has the required yoyo tables. Skipping creation.")
+    finally:
+        await config.close()
 
 
 async def cmd_clean(config: Config) -> None:
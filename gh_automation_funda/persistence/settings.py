@@ -7,7 +7,7 @@ from logging import getLogger
 from typing import Annotated, TypeVar
 
 import httpx
-from pydantic import BaseModel, BeforeValidator
+from pydantic import BaseModel, BeforeValidator, ValidationError
 
 logger = getLogger(__name__)
 
@@ -40,17 +40,23 @@ async def read_google_sheets(sheet_id: str, gid: str, model_class: type[ModelT])
         logger.error(f"Error while reading Google Sheet: {e}")
         return rows
 
-    csv_data = StringIO(response.text)
-    csv_reader = csv.DictReader(csv_data)
+    # The whole text is parsed at once, as quoted cells may span several lines.
+    csv_reader = csv.reader(StringIO(response.text))
+    header = next(csv_reader, [])
+    # The positions of the columns used by the model are looked up once, from the header.
+    columns = [(name, i) for i, name in enumerate(header) if name in model_class.__annotations__]
 
-    row: dict[str, str]
     all_rows_are_valid = True
 
-    for row in csv_reader:
+    for csv_row in csv_reader:
+        if not csv_row:
+            continue
+
+        row = {name: csv_row[i] for name, i in columns if i < len(csv_row)}
         try:
-            row_instance = model_class(**{k: v for k, v in row.items() if k in model_class.__annotations__})
+            row_instance = model_class.model_validate(row)
             rows.append(row_instance)
-        except Exception as e:
+        except ValidationError as e:
             all_rows_are_valid = False
             logger.error(f"Skipping row {row} due to error: {e}")
 
@@ -9,4 +9,7 @@ async def cmd_funda(config: Config) -> None:
     Retrieve new properties from Funda.nl, and data from kadasterdata.nl and wozwaardeloket.nl.
     """
     funda_logic = Funda(config=config)
-    await funda_logic.get_new_properties()
+    try:
+        await funda_logic.get_new_properties()
+    finally:
+        await config.close()